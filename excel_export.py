@@ -4,10 +4,49 @@ from __future__ import annotations
 import argparse
 import json
 from pathlib import Path
-from typing import Dict, List
 
 import pandas as pd
 
+try:
+    import orjson
+except ImportError:  # необязательная зависимость, см. extra "fast"
+    orjson = None
+
+
+NUM_COLS = (
+    "turnover",
+    "trade_buy_cash",
+    "trade_sell_cash",
+    "commissions",
+    "taxes",
+    "dividends",
+    "coupons",
+    "deposits",
+    "withdrawals",
+    "other",
+    "net_excl",
+    "net_incl",
+)
+WINDOW_KINDS = ("day", "week", "month", "year")
+KEY_COLS = ("kind", "start", "end", "currency")
+ALL_COLS = KEY_COLS + NUM_COLS
+
+# колонка Excel -> поле stats в JSON
+_STATS_KEYS = {
+    "turnover": "turnover",
+    "trade_buy_cash": "trade_buy_cash",
+    "trade_sell_cash": "trade_sell_cash",
+    "commissions": "commissions",
+    "taxes": "taxes",
+    "dividends": "dividends",
+    "coupons": "coupons",
+    "deposits": "deposits",
+    "withdrawals": "withdrawals",
+    "other": "other",
+    "net_excl": "net_cashflow_excl_deposits",
+    "net_incl": "net_cashflow_incl_deposits",
+}
+
 
 def _to_naive_datetime(series: pd.Series) -> pd.Series:
     """Parse ISO datetimes and strip timezone to make them Excel-friendly.
@@ -25,34 +64,20 @@ def _to_naive_datetime(series: pd.Series) -> pd.Series:
 
 
 def _flatten(json_path: Path) -> pd.DataFrame:
-    with json_path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    rows: List[Dict] = []
-    for w in data.get("windows", []):
-        stats = w.get("stats", {}) or {}
-        rows.append(
-            dict(
-                kind=w.get("kind"),
-                start=w.get("start"),
-                end=w.get("end"),
-                currency=w.get("currency"),
-                turnover=stats.get("turnover", 0.0),
-                trade_buy_cash=stats.get("trade_buy_cash", 0.0),
-                trade_sell_cash=stats.get("trade_sell_cash", 0.0),
-                commissions=stats.get("commissions", 0.0),
-                taxes=stats.get("taxes", 0.0),
-                dividends=stats.get("dividends", 0.0),
-                coupons=stats.get("coupons", 0.0),
-                deposits=stats.get("deposits", 0.0),
-                withdrawals=stats.get("withdrawals", 0.0),
-                other=stats.get("other", 0.0),
-                net_excl=stats.get("net_cashflow_excl_deposits", 0.0),
-                net_incl=stats.get("net_cashflow_incl_deposits", 0.0),
-            )
-        )
-
-    df = pd.DataFrame(rows)
+    if orjson is not None:
+        data = orjson.loads(json_path.read_bytes())
+    else:
+        with json_path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    # Собираем колонки списками и отдаём их в DataFrame одним вызовом
+    # (без промежуточного dict на каждую строку); вложенные instruments не трогаем
+    windows = data.get("windows", [])
+    stats = [w.get("stats", {}) or {} for w in windows]
+    cols = {c: [w.get(c) for w in windows] for c in KEY_COLS}
+    for col, key in _STATS_KEYS.items():
+        cols[col] = [st.get(key, 0.0) for st in stats]
+    df = pd.DataFrame(cols, columns=list(ALL_COLS))
     if df.empty:
         return df
 
@@ -60,7 +85,7 @@ def _flatten(json_path: Path) -> pd.DataFrame:
     df["start"] = _to_naive_datetime(df["start"])
     df["end"] = _to_naive_datetime(df["end"])
 
-    return df.sort_values(["kind", "start", "currency"]).reset_index(drop=True)
+    return df.sort_values(["kind", "start", "currency"], kind="stable", ignore_index=True)
 
 
 def export_excel(json_path: Path, xlsx_path: Path) -> None:
@@ -76,10 +101,14 @@ def export_excel(json_path: Path, xlsx_path: Path) -> None:
         # Даже если df пустой — создадим файл с пустым листом Data.
         df.to_excel(writer, index=False, sheet_name="Data")
 
+        # Один проход groupby вместо маски df["kind"] == kind на каждый вид окна
+        kind_cat = pd.Categorical(df["kind"], categories=WINDOW_KINDS)
+        groups = dict(tuple(df.groupby(kind_cat, sort=False, observed=True)))
+
         # Развороты по видам окна
-        for kind in ["day", "week", "month", "year"]:
-            dfk = df[df["kind"] == kind]
-            if dfk.empty:
+        for kind in WINDOW_KINDS:
+            dfk = groups.get(kind)
+            if dfk is None or dfk.empty:
                 continue
             dfk_out = (
                 dfk[
@@ -102,26 +131,42 @@ def export_excel(json_path: Path, xlsx_path: Path) -> None:
         # Summary + графики: приоритет — month, иначе week, иначе skip
         chart_kind = None
         for cand in ("month", "week"):
-            if (not df.empty) and (df["kind"] == cand).any():
+            if cand in groups:
                 chart_kind = cand
                 break
 
         if chart_kind:
             sheet_name = "Summary"
-            dfc = df[df["kind"] == chart_kind].copy().sort_values(["start", "currency"])
+            dfk = groups[chart_kind]
+            # Каждая валюта — сплошной блок строк, чтобы графики брали её диапазон
+            dfc = dfk.sort_values(["currency", "start"], kind="stable")
+            # Кумулятивный net_excl считаем в pandas и пишем вместе с таблицей
+            dfc = dfc.assign(
+                cum_net_excl=dfc.groupby("currency", sort=False)["net_excl"].cumsum()
+            )
             dfc.to_excel(writer, index=False, sheet_name=sheet_name)
 
             if not dfc.empty:
                 wb = writer.book
                 ws = writer.sheets[sheet_name]
 
-                # Первая валюта для графиков
-                first_cur = dfc["currency"].iloc[0]
-                dff = dfc[dfc["currency"] == first_cur].copy()
-                if not dff.empty:
+                # Первая валюта для графиков — валюта самого раннего окна (dfk
+                # отсортирован по start, currency)
+                first_cur = dfk["currency"].iloc[0]
+                # Графикам нужен только диапазон строк first_cur: копию кадра
+                # не делаем, а при одной валюте обходимся и без маски
+                if dfc["currency"].nunique() == 1:
                     start_row = 1  # первая строка с данными (после заголовка)
-                    col_idx_date = dff.columns.get_loc("start")
-                    col_idx_net = dff.columns.get_loc("net_excl")
+                    n_rows = len(dfc)
+                else:
+                    cur_mask = (dfc["currency"] == first_cur).to_numpy()
+                    # первая строка блока first_cur (строка 0 — заголовок)
+                    start_row = 1 + int(cur_mask.argmax())
+                    n_rows = int(cur_mask.sum())
+                if n_rows:
+                    end_row = start_row + n_rows - 1
+                    col_idx_date = dfc.columns.get_loc("start")
+                    col_idx_net = dfc.columns.get_loc("net_excl")
 
                     # Столбчатая диаграмма net_excl
                     chart_bar = wb.add_chart({"type": "column"})
@@ -132,14 +177,14 @@ def export_excel(json_path: Path, xlsx_path: Path) -> None:
                                 sheet_name,
                                 start_row,
                                 col_idx_date,
-                                start_row + len(dff) - 1,
+                                end_row,
                                 col_idx_date,
                             ],
                             "values": [
                                 sheet_name,
                                 start_row,
                                 col_idx_net,
-                                start_row + len(dff) - 1,
+                                end_row,
                                 col_idx_net,
                             ],
                         }
@@ -151,14 +196,8 @@ def export_excel(json_path: Path, xlsx_path: Path) -> None:
                     chart_bar.set_y_axis({"name": first_cur})
                     ws.insert_chart("L2", chart_bar, {"x_scale": 1.4, "y_scale": 1.3})
 
-                    # Кумулятивная линия по net_excl
-                    dff["cum_net_excl"] = dff["net_excl"].cumsum()
-                    # Вписываем вспомогательный столбец на лист Summary (рядом с таблицей)
-                    base_row = start_row
-                    cum_col = len(dfc.columns)  # следующая свободная колонка
-                    ws.write(0, cum_col, "cum_net_excl")
-                    for i, v in enumerate(dff["cum_net_excl"].tolist()):
-                        ws.write(base_row + i, cum_col, float(v))
+                    # Кумулятивная линия по net_excl (колонка уже записана на лист Summary)
+                    cum_col = dfc.columns.get_loc("cum_net_excl")
 
                     chart_line = wb.add_chart({"type": "line"})
                     chart_line.add_series(
@@ -168,14 +207,14 @@ def export_excel(json_path: Path, xlsx_path: Path) -> None:
                                 sheet_name,
                                 start_row,
                                 col_idx_date,
-                                start_row + len(dff) - 1,
+                                end_row,
                                 col_idx_date,
                             ],
                             "values": [
                                 sheet_name,
                                 start_row,
                                 cum_col,
-                                start_row + len(dff) - 1,
+                                end_row,
                                 cum_col,
                             ],
                         }
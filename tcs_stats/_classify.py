@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Operation type classification shared by the collect and report CLIs."""
+from __future__ import annotations
+
+from enum import IntEnum
+from functools import lru_cache
+from typing import Dict
+
+
+def _is_trade(op_type_name: str) -> bool:
+    n = op_type_name.upper()
+    return ("BUY" in n) or ("SELL" in n)
+
+
+def _is_fee(op_type_name: str) -> bool:
+    n = op_type_name.upper()
+    return ("FEE" in n) or ("COMMISSION" in n) or ("SERVICE" in n)
+
+
+def _is_tax(op_type_name: str) -> bool:
+    return "TAX" in op_type_name.upper()
+
+
+def _is_dividend(op_type_name: str) -> bool:
+    return "DIVIDEND" in op_type_name.upper()
+
+
+def _is_coupon(op_type_name: str) -> bool:
+    return "COUPON" in op_type_name.upper()
+
+
+def _is_deposit(op_type_name: str) -> bool:
+    n = op_type_name.upper()
+    return ("INPUT" in n) or ("DEPOSIT" in n)
+
+
+def _is_withdrawal(op_type_name: str) -> bool:
+    n = op_type_name.upper()
+    return ("WITHDRAW" in n) or ("OUTPUT" in n)
+
+
+class OpCategory(IntEnum):
+    """Cashflow category of an operation type."""
+    TRADE = 0
+    FEE = 1
+    TAX = 2
+    DIVIDEND = 3
+    COUPON = 4
+    DEPOSIT = 5
+    WITHDRAWAL = 6
+    OTHER = 7
+
+
+@lru_cache(maxsize=256)
+def classify(op_type_name: str) -> OpCategory:
+    """Classify an operation type name (the SDK enum is small, so memoize)."""
+    if _is_trade(op_type_name):
+        return OpCategory.TRADE
+    if _is_fee(op_type_name):
+        return OpCategory.FEE
+    if _is_tax(op_type_name):
+        return OpCategory.TAX
+    if _is_dividend(op_type_name):
+        return OpCategory.DIVIDEND
+    if _is_coupon(op_type_name):
+        return OpCategory.COUPON
+    if _is_deposit(op_type_name):
+        return OpCategory.DEPOSIT
+    if _is_withdrawal(op_type_name):
+        return OpCategory.WITHDRAWAL
+    return OpCategory.OTHER
+
+
+# SDK operation types are shared enum members: resolve each one only once.
+_CATEGORY_BY_TYPE: Dict[object, OpCategory] = {}
+
+
+def type_category(op_type) -> OpCategory:
+    cat = _CATEGORY_BY_TYPE.get(op_type)
+    if cat is None:
+        cat = classify(getattr(op_type, "name", "UNSPECIFIED"))
+        _CATEGORY_BY_TYPE[op_type] = cat
+    return cat
+
+
+def op_type_attr(op) -> str:
+    """Name of the attribute holding the operation type on an SDK message.
+
+    ``OperationItem`` (cursor API) uses ``type``, ``Operation`` uses
+    ``operation_type``; messages of one stream share the schema.
+    """
+    return "operation_type" if hasattr(op, "operation_type") else "type"
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Prefetching operations pager shared by the collect and report CLIs."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+
+from tinkoff.invest import GetOperationsByCursorRequest, OperationState
+
+
+async def _produce_pages(
+    queue: asyncio.Queue,
+    services,
+    account_id: str,
+    dt_from_utc: datetime,
+    dt_to_utc: datetime,
+) -> None:
+    """Put cursor pages (lists of operations) into queue; None marks the end."""
+    has_next = True
+    cursor: str | None = None
+    try:
+        while has_next:
+            req = GetOperationsByCursorRequest(
+                account_id=account_id,
+                from_=dt_from_utc,
+                to=dt_to_utc,
+                cursor=cursor or "",
+                limit=1000,
+                state=OperationState.OPERATION_STATE_EXECUTED,
+                # without_trades=False  # по умолчанию False, сделки вернутся; оставляем как есть
+            )
+            resp = await services.operations.get_operations_by_cursor(req)
+            await queue.put(resp.items)
+            has_next = bool(resp.has_next)
+            cursor = resp.next_cursor if has_next else None
+    except Exception:
+        await queue.put(None)
+        raise
+    await queue.put(None)
+
+
+async def iter_operations(
+    services,
+    account_id: str,
+    dt_from_utc: datetime,
+    dt_to_utc: datetime,
+):
+    """Yield operations via cursor pagination (executed only).
+
+    Pages are fetched by a background task, so the request for page N+1 is
+    in flight while the caller aggregates page N.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+    producer = asyncio.create_task(
+        _produce_pages(queue, services, account_id, dt_from_utc, dt_to_utc)
+    )
+    try:
+        while (batch := await queue.get()) is not None:
+            for item in batch:
+                yield item
+        await producer  # re-raise API errors from the producer
+    finally:
+        producer.cancel()
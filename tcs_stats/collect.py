@@ -6,19 +6,18 @@ import asyncio
 import json
 import os
 from collections import defaultdict
-from datetime import datetime, timedelta, timezone
-from decimal import Decimal
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
-from zoneinfo import ZoneInfo
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-from tinkoff.invest import (
-    AsyncClient,
-    OperationState,
-    GetOperationsByCursorRequest,
-)
+from tinkoff.invest import AsyncClient
 from tinkoff.invest.async_services import AsyncServices
 
+try:
+    import orjson
+except ImportError:  # optional dependency, see extra "fast"
+    orjson = None
+
 from tcs_stats.models import (
     CurrencyBreakdown,
     InstrumentBreakdown,
@@ -28,81 +27,23 @@ from tcs_stats.models import (
     WindowRecord,
     WindowKind,
 )
-from tcs_stats.time_windows import split_into_windows, Window
-from tcs_stats.utils import decimal_from_units_nano, safe_currency, round_money
-
-
-# ---- classification helpers -------------------------------------------------
-
-
-def _is_trade(op_type_name: str) -> bool:
-    n = op_type_name.upper()
-    return ("BUY" in n) or ("SELL" in n)
-
-
-def _is_fee(op_type_name: str) -> bool:
-    n = op_type_name.upper()
-    return ("FEE" in n) or ("COMMISSION" in n) or ("SERVICE" in n)
-
-
-def _is_tax(op_type_name: str) -> bool:
-    return "TAX" in op_type_name.upper()
-
-
-def _is_dividend(op_type_name: str) -> bool:
-    return "DIVIDEND" in op_type_name.upper()
-
-
-def _is_coupon(op_type_name: str) -> bool:
-    return "COUPON" in op_type_name.upper()
-
-
-def _is_deposit(op_type_name: str) -> bool:
-    n = op_type_name.upper()
-    return ("INPUT" in n) or ("DEPOSIT" in n)
-
-
-def _is_withdrawal(op_type_name: str) -> bool:
-    n = op_type_name.upper()
-    return ("WITHDRAW" in n) or ("OUTPUT" in n)
+from tcs_stats.time_windows import get_tz, split_into_windows, Window
+from tcs_stats._classify import OpCategory, op_type_attr, type_category
+from tcs_stats._paging import iter_operations
+from tcs_stats.utils import ensure_tz, nanos_from_units_nano, round_nanos, safe_currency
 
 
 # ---- core aggregation --------------------------------------------------------
 
 
-async def _iter_operations(
-    services,
-    account_id: str,
-    dt_from_utc: datetime,
-    dt_to_utc: datetime,
-):
-    """Yield operations via cursor pagination (executed only)."""
-    has_next = True
-    cursor: str | None = None
-    while has_next:
-        req = GetOperationsByCursorRequest(
-            account_id=account_id,
-            from_=dt_from_utc,
-            to=dt_to_utc,
-            cursor=cursor or "",
-            limit=1000,
-            state=OperationState.OPERATION_STATE_EXECUTED,
-            # without_trades=False  # по умолчанию False, сделки вернутся; оставляем как есть
-        )
-        resp = await services.operations.get_operations_by_cursor(req)
-        for item in resp.items:
-            yield item
-        has_next = bool(resp.has_next)
-        cursor = resp.next_cursor if has_next else None
-
-
-
-def _init_bucket() -> Dict[str, RunningTotals]:
-    return defaultdict(RunningTotals)  # per-currency totals
-
-
-def _bucket_key(kind: WindowKind, start: datetime, currency: str) -> str:
-    return f"{kind}::{start.isoformat()}::{currency}"
+def _split_range(
+    start: datetime, end: datetime, parts: int
+) -> List[Tuple[datetime, datetime]]:
+    """Split [start, end) into `parts` contiguous sub-ranges of equal length."""
+    parts = max(1, parts)
+    step = (end - start) / parts
+    bounds = [start + step * i for i in range(parts)] + [end]
+    return list(zip(bounds, bounds[1:]))
 
 
 def _instrument_identity(op) -> Tuple[str, str]:
@@ -125,25 +66,26 @@ def _instrument_identity(op) -> Tuple[str, str]:
     return instrument_id, " - ".join(display_parts)
 
 
-def _apply_amount(totals: RunningTotals, amount: Decimal, op_type_name: str) -> None:
-    if _is_trade(op_type_name):
+def _apply_amount(totals: RunningTotals, amount: int, cat: OpCategory) -> None:
+    mag = -amount if amount < 0 else amount
+    if cat is OpCategory.TRADE:
         if amount < 0:
-            totals.trade_buy_cash += (-amount)
+            totals.trade_buy_cash += mag
         else:
             totals.trade_sell_cash += amount
-        totals.turnover += abs(amount)
-    elif _is_fee(op_type_name):
-        totals.commissions += (-amount if amount < 0 else amount)
-    elif _is_tax(op_type_name):
-        totals.taxes += (-amount if amount < 0 else amount)
-    elif _is_dividend(op_type_name):
-        totals.dividends += (amount if amount > 0 else -amount)
-    elif _is_coupon(op_type_name):
-        totals.coupons += (amount if amount > 0 else -amount)
-    elif _is_deposit(op_type_name):
-        totals.deposits += (amount if amount > 0 else -amount)
-    elif _is_withdrawal(op_type_name):
-        totals.withdrawals += (-amount if amount < 0 else amount)
+        totals.turnover += mag
+    elif cat is OpCategory.FEE:
+        totals.commissions += mag
+    elif cat is OpCategory.TAX:
+        totals.taxes += mag
+    elif cat is OpCategory.DIVIDEND:
+        totals.dividends += mag
+    elif cat is OpCategory.COUPON:
+        totals.coupons += mag
+    elif cat is OpCategory.DEPOSIT:
+        totals.deposits += mag
+    elif cat is OpCategory.WITHDRAWAL:
+        totals.withdrawals += mag
     else:
         totals.other += amount
 
@@ -154,30 +96,31 @@ def _totals_to_breakdown(t: RunningTotals) -> CurrencyBreakdown:
     )
     net_incl = net_excl + t.deposits - t.withdrawals
     return {
-        "turnover": round_money(t.turnover),
-        "trade_buy_cash": round_money(t.trade_buy_cash),
-        "trade_sell_cash": round_money(t.trade_sell_cash),
-        "commissions": round_money(t.commissions),
-        "taxes": round_money(t.taxes),
-        "dividends": round_money(t.dividends),
-        "coupons": round_money(t.coupons),
-        "deposits": round_money(t.deposits),
-        "withdrawals": round_money(t.withdrawals),
-        "other": round_money(t.other),
-        "net_cashflow_excl_deposits": round_money(net_excl),
-        "net_cashflow_incl_deposits": round_money(net_incl),
+        "turnover": round_nanos(t.turnover),
+        "trade_buy_cash": round_nanos(t.trade_buy_cash),
+        "trade_sell_cash": round_nanos(t.trade_sell_cash),
+        "commissions": round_nanos(t.commissions),
+        "taxes": round_nanos(t.taxes),
+        "dividends": round_nanos(t.dividends),
+        "coupons": round_nanos(t.coupons),
+        "deposits": round_nanos(t.deposits),
+        "withdrawals": round_nanos(t.withdrawals),
+        "other": round_nanos(t.other),
+        "net_cashflow_excl_deposits": round_nanos(net_excl),
+        "net_cashflow_incl_deposits": round_nanos(net_incl),
     }
 
 
-async def collect_stats(
+async def collect_window_records(
     token: str,
     account_id: str,
     since_local: datetime,
     until_local: datetime,
     tz_name: str = "Europe/Moscow",
     kinds: Iterable[WindowKind] = ("day", "week", "month", "year"),
-) -> StatsJSON:
-    """Collect statistics into structured JSON.
+    concurrency: int = 1,
+) -> Tuple[MetaInfo, Iterator[WindowRecord]]:
+    """Collect statistics and return meta plus a lazy stream of window records.
 
     Args:
         token: Tinkoff Invest API token.
@@ -186,118 +129,115 @@ async def collect_stats(
         until_local: Exclusive upper bound in local tz.
         tz_name: IANA timezone name, default Europe/Moscow.
         kinds: Window kinds to compute.
+        concurrency: Number of disjoint sub-ranges fetched in parallel.
 
     Returns:
-        StatsJSON dict ready to dump.
+        MetaInfo and an iterator of WindowRecord sorted by (kind, start,
+        currency); records are built on demand.
     """
-    tz = ZoneInfo(tz_name)
-    since_local = since_local.astimezone(tz)
-    until_local = until_local.astimezone(tz)
+    tz = get_tz(tz_name)
+    since_local = ensure_tz(since_local, tz)
+    until_local = ensure_tz(until_local, tz)
 
     windows = split_into_windows(since_local, until_local, tz, kinds)
-    # Index windows by (kind, start) to place ops fast
-    by_kind_start: Dict[tuple[str, datetime], Window] = {
-        (w.kind, w.start): w for w in windows
-    }
-
-    # Pre-build ordered lists per kind for quick lookup
-    kind_to_windows: Dict[str, List[Window]] = defaultdict(list)
+    # Windows of one kind are disjoint, so each op maps to at most one window
+    # per kind: index them by calendar key (day, Monday, (year, month), year).
+    # Each entry carries the window's start ISO string, formatted once here.
+    day_index: Dict[date, Tuple[Window, str]] = {}
+    week_index: Dict[date, Tuple[Window, str]] = {}
+    month_index: Dict[Tuple[int, int], Tuple[Window, str]] = {}
+    year_index: Dict[int, Tuple[Window, str]] = {}
+    end_by_key: Dict[Tuple[str, str], str] = {}
     for w in windows:
-        kind_to_windows[w.kind].append(w)
+        d = w.start.date()
+        start_iso = w.start.isoformat()
+        end_by_key[(w.kind, start_iso)] = w.end.isoformat()
+        if w.kind == "day":
+            day_index[d] = (w, start_iso)
+        elif w.kind == "week":
+            week_index[d - timedelta(days=d.weekday())] = (w, start_iso)
+        elif w.kind == "month":
+            month_index[(d.year, d.month)] = (w, start_iso)
+        else:
+            year_index[d.year] = (w, start_iso)
 
-    # Aggregation buckets: key -> currency -> totals
-    buckets: Dict[str, Dict[str, RunningTotals]] = defaultdict(_init_bucket)
+    # Aggregation buckets: (kind, start_iso, currency) -> totals
+    buckets: Dict[Tuple[str, str, str], RunningTotals] = defaultdict(RunningTotals)
     day_instrument_buckets: Dict[
         Tuple[str, str], Dict[str, Tuple[str, RunningTotals]]
     ] = defaultdict(dict)
 
-    async with AsyncClient(token) as client:
-        services = client
-        since_utc = since_local.astimezone(timezone.utc)
-        until_utc = until_local.astimezone(timezone.utc)
+    async def aggregate_range(services, dt_from_utc: datetime, dt_to_utc: datetime) -> None:
+        # Safe to share buckets between tasks: no await between read and update.
+        type_attr: str | None = None
+        async for op in iter_operations(services, account_id, dt_from_utc, dt_to_utc):
+            op_dt = getattr(op, "date", None)
+            if op_dt is None or not (dt_from_utc <= op_dt < dt_to_utc):
+                # Drops boundary items the API may return and keeps ops on a
+                # shared sub-range boundary in exactly one sub-range.
+                continue
 
-        async for op in _iter_operations(services, account_id, since_utc, until_utc):
-            # Defensive parsing (schema may evolve)
-            # op_type_name = getattr(op.operation_type, "name", "UNSPECIFIED")
-            op_type = getattr(op, "operation_type", None) or getattr(op, "type", None)
-            op_type_name = getattr(op_type, "name", "UNSPECIFIED")
-            cur = safe_currency(getattr(getattr(op, "payment", None), "currency", None))
             pay = getattr(op, "payment", None)
             if pay is None:
                 # Some operations might not have direct payment (ignore for cashflow)
                 continue
+            if pay.units == 0 and pay.nano == 0:
+                # Non-cash state transitions: nothing to add anywhere
+                continue
+
+            # Defensive parsing (schema may evolve)
+            if type_attr is None:
+                type_attr = op_type_attr(op)
+            op_type = getattr(op, type_attr, None)
+            cat = type_category(op_type)
+            cur = safe_currency(getattr(pay, "currency", None))
 
-            amount = decimal_from_units_nano(pay.units, pay.nano)
+            amount = nanos_from_units_nano(pay.units, pay.nano)
 
             # Convert op timestamp to local tz to map into windows
-            op_dt = getattr(op, "date", None)
-            if op_dt is None:
-                continue
             op_local = op_dt.astimezone(tz)
 
             instrument_id, instrument_name = _instrument_identity(op)
             has_instrument = instrument_id != "UNSPECIFIED"
 
-            # Place operation into all windows that cover its timestamp.
-            # For each requested kind we have disjoint, ordered windows.
-            for kind, win_list in kind_to_windows.items():
-                # Binary search would be faster; linear is OK for daily usage size.
-                for w in win_list:
-                    if w.start <= op_local < w.end:
-                        totals = buckets[_bucket_key(w.kind, w.start, cur)][cur]
-                        _apply_amount(totals, amount, op_type_name)
-
-                        if w.kind == "day" and has_instrument:
-                            key = (w.start.isoformat(), cur)
-                            inst_map = day_instrument_buckets[key]
-                            entry = inst_map.get(instrument_id)
-                            if entry is None:
-                                entry = (instrument_name, RunningTotals())
-                                inst_map[instrument_id] = entry
-                            _apply_amount(entry[1], amount, op_type_name)
-                        break  # found the window; move to next kind/op
-
-    # Build output list
-    out_windows: List[WindowRecord] = []
-    for key, by_cur in buckets.items():
-        kind_str, start_iso, _cur_key = key.split("::")
-        for currency, t in by_cur.items():
-            window_record: WindowRecord = {
-                "kind": kind_str,  # type: ignore
-                "start": start_iso,
-                "end": next(
-                    w.end.isoformat()
-                    for w in windows
-                    if w.kind == kind_str and w.start.isoformat() == start_iso
-                ),
-                "currency": currency,
-                "stats": _totals_to_breakdown(t),
-            }
-
-            if kind_str == "day":
-                inst_key = (start_iso, currency)
-                inst_map = day_instrument_buckets.get(inst_key)
-                if inst_map:
-                    instruments: List[InstrumentBreakdown] = []
-                    for instrument_id, (instrument_name, totals) in inst_map.items():
-                        breakdown = _totals_to_breakdown(totals)
-                        instruments.append(
-                            {
-                                "instrument_id": instrument_id,
-                                "instrument_name": instrument_name,
-                                "currency": currency,
-                                "stats": breakdown,
-                            }
-                        )
-                    instruments.sort(
-                        key=lambda item: (
-                            -item["stats"]["net_cashflow_excl_deposits"],
-                            item["instrument_name"],
-                        )
-                    )
-                    window_record["instruments"] = instruments
+            # Place operation into all windows that cover its timestamp. The op is
+            # already inside [since, until), so the calendar key alone picks the
+            # window even for the clipped edge ones.
+            op_day = op_local.date()
+            candidates = (
+                day_index.get(op_day),
+                week_index.get(op_day - timedelta(days=op_day.weekday())),
+                month_index.get((op_day.year, op_day.month)),
+                year_index.get(op_day.year),
+            )
+            for entry in candidates:
+                if entry is None:
+                    continue
+                w, start_iso = entry
+                totals = buckets[(w.kind, start_iso, cur)]
+                _apply_amount(totals, amount, cat)
+
+                if w.kind == "day" and has_instrument:
+                    key = (start_iso, cur)
+                    inst_map = day_instrument_buckets[key]
+                    inst_entry = inst_map.get(instrument_id)
+                    if inst_entry is None:
+                        inst_entry = (instrument_name, RunningTotals())
+                        inst_map[instrument_id] = inst_entry
+                    _apply_amount(inst_entry[1], amount, cat)
 
-            out_windows.append(window_record)
+    async with AsyncClient(token) as client:
+        since_utc = since_local.astimezone(timezone.utc)
+        until_utc = until_local.astimezone(timezone.utc)
+        ranges = _split_range(since_utc, until_utc, concurrency)
+        if len(ranges) == 1:
+            await aggregate_range(client, *ranges[0])
+        else:
+            # TaskGroup cancels and awaits the other sub-ranges if one fails,
+            # so none of them outlives the client.
+            async with asyncio.TaskGroup() as tg:
+                for part_from, part_to in ranges:
+                    tg.create_task(aggregate_range(client, part_from, part_to))
 
     meta: MetaInfo = {
         "timezone": tz_name,
@@ -307,9 +247,101 @@ async def collect_stats(
         "until": until_local.isoformat(),
         "sdk": "tinkoff.invest (async, operations.get_operations_by_cursor)",
     }
+    return meta, _iter_window_records(buckets, day_instrument_buckets, end_by_key)
+
+
+def _iter_window_records(
+    buckets: Dict[Tuple[str, str, str], RunningTotals],
+    day_instrument_buckets: Dict[Tuple[str, str], Dict[str, Tuple[str, RunningTotals]]],
+    end_by_key: Dict[Tuple[str, str], str],
+) -> Iterator[WindowRecord]:
+    """Yield window records ordered by (kind, start, currency)."""
+    for key in sorted(buckets):
+        kind_str, start_iso, currency = key
+        window_record: WindowRecord = {
+            "kind": kind_str,  # type: ignore
+            "start": start_iso,
+            "end": end_by_key[(kind_str, start_iso)],
+            "currency": currency,
+            "stats": _totals_to_breakdown(buckets[key]),
+        }
+
+        if kind_str == "day":
+            inst_key = (start_iso, currency)
+            inst_map = day_instrument_buckets.get(inst_key)
+            if inst_map:
+                instruments: List[InstrumentBreakdown] = []
+                for instrument_id, (instrument_name, totals) in inst_map.items():
+                    breakdown = _totals_to_breakdown(totals)
+                    instruments.append(
+                        {
+                            "instrument_id": instrument_id,
+                            "instrument_name": instrument_name,
+                            "currency": currency,
+                            "stats": breakdown,
+                        }
+                    )
+                instruments.sort(
+                    key=lambda item: (
+                        -item["stats"]["net_cashflow_excl_deposits"],
+                        item["instrument_name"],
+                    )
+                )
+                window_record["instruments"] = instruments
+
+        yield window_record
+
+
+async def collect_stats(
+    token: str,
+    account_id: str,
+    since_local: datetime,
+    until_local: datetime,
+    tz_name: str = "Europe/Moscow",
+    kinds: Iterable[WindowKind] = ("day", "week", "month", "year"),
+    concurrency: int = 1,
+) -> StatsJSON:
+    """Collect statistics into structured JSON.
+
+    Same arguments as ``collect_window_records``; materializes all windows.
 
-    result: StatsJSON = {"meta": meta, "windows": sorted(out_windows, key=lambda x: (x["kind"], x["start"], x["currency"]))}
-    return result
+    Returns:
+        StatsJSON dict ready to dump.
+    """
+    meta, records = await collect_window_records(
+        token, account_id, since_local, until_local, tz_name, kinds, concurrency
+    )
+    return {"meta": meta, "windows": list(records)}
+
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def write_stats_json(path: Path, meta: MetaInfo, records: Iterable[WindowRecord]) -> None:
+    """Write StatsJSON to path, serializing window records one at a time."""
+    with path.open("wb") as f:
+        f.write(b'{"meta": ')
+        f.write(_dumps(meta))
+        f.write(b',\n"windows": [')
+        sep = b"\n"
+        for record in records:
+            f.write(sep)
+            f.write(_dumps(record))
+            sep = b",\n"
+        f.write(b"\n]}\n")
+
+
+def _positive_int(value: str) -> int:
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, got {value!r}") from None
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be >= 1, got {n}")
+    return n
 
 
 def _parse_args() -> argparse.Namespace:
@@ -328,6 +360,15 @@ def _parse_args() -> argparse.Namespace:
         default="day,week,month,year",
         help="Comma-separated windows: day,week,month,year",
     )
+    p.add_argument(
+        "--concurrency",
+        type=_positive_int,
+        default=1,
+        help=(
+            "Fetch the range as N disjoint sub-ranges in parallel (mind API rate limits). "
+            "With N > 1, API errors are raised as an ExceptionGroup."
+        ),
+    )
     p.add_argument("--out", type=Path, default=Path("out") / "stats.json", help="Output JSON path")
     return p.parse_args()
 
@@ -339,7 +380,7 @@ async def _amain() -> None:
     if not args.account_id:
         raise SystemExit("ACCOUNT_ID is required (env or --account-id).")
 
-    tz = ZoneInfo(args.tz)
+    tz = get_tz(args.tz)
     today_local = datetime.now(tz=tz).replace(hour=0, minute=0, second=0, microsecond=0)
     since = (
         datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=tz)
@@ -353,18 +394,18 @@ async def _amain() -> None:
     )
     kinds: List[WindowKind] = [k.strip() for k in args.windows.split(",") if k.strip()]
 
-    data = await collect_stats(
+    meta, records = await collect_window_records(
         token=args.token,
         account_id=args.account_id,
         since_local=since,
         until_local=until,
         tz_name=args.tz,
         kinds=kinds,  # type: ignore
+        concurrency=args.concurrency,
     )
 
     args.out.parent.mkdir(parents=True, exist_ok=True)
-    with args.out.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    write_stats_json(args.out, meta, records)
     print(f"Wrote JSON: {args.out}")
 
 
@@ -3,7 +3,6 @@ from __future__ import annotations
 
 from dataclasses import dataclass, asdict
 from datetime import datetime
-from decimal import Decimal
 from typing import Dict, List, Literal, Optional, TypedDict, NotRequired
 
 WindowKind = Literal["day", "week", "month", "year"]
@@ -55,15 +54,16 @@ class StatsJSON(TypedDict):
     windows: List[WindowRecord]
 
 
-@dataclass
+@dataclass(slots=True)
 class RunningTotals:
-    turnover: Decimal = Decimal("0")
-    trade_buy_cash: Decimal = Decimal("0")
-    trade_sell_cash: Decimal = Decimal("0")
-    commissions: Decimal = Decimal("0")
-    taxes: Decimal = Decimal("0")
-    dividends: Decimal = Decimal("0")
-    coupons: Decimal = Decimal("0")
-    deposits: Decimal = Decimal("0")
-    withdrawals: Decimal = Decimal("0")
-    other: Decimal = Decimal("0")
+    """Per-bucket totals in integer nanounits (see utils.nanos_from_units_nano)."""
+    turnover: int = 0
+    trade_buy_cash: int = 0
+    trade_sell_cash: int = 0
+    commissions: int = 0
+    taxes: int = 0
+    dividends: int = 0
+    coupons: int = 0
+    deposits: int = 0
+    withdrawals: int = 0
+    other: int = 0
@@ -7,55 +7,28 @@ import os
 from dataclasses import dataclass
 from collections import defaultdict
 from datetime import date, datetime, timedelta, time
-from decimal import Decimal
 from typing import Dict, List, Tuple
-from zoneinfo import ZoneInfo
 
-from tinkoff.invest import AsyncClient, GetOperationsByCursorRequest, OperationState
+from tinkoff.invest import AsyncClient
 
-from utils import decimal_from_units_nano, round_money, safe_currency, to_utc
-
-
-# ---- classification helpers --------------------------------------------------
-
-
-def _is_trade(op_type_name: str) -> bool:
-    n = op_type_name.upper()
-    return ("BUY" in n) or ("SELL" in n)
-
-
-def _is_fee(op_type_name: str) -> bool:
-    n = op_type_name.upper()
-    return ("FEE" in n) or ("COMMISSION" in n) or ("SERVICE" in n)
-
-
-def _is_tax(op_type_name: str) -> bool:
-    return "TAX" in op_type_name.upper()
-
-
-def _is_dividend(op_type_name: str) -> bool:
-    return "DIVIDEND" in op_type_name.upper()
-
-
-def _is_coupon(op_type_name: str) -> bool:
-    return "COUPON" in op_type_name.upper()
-
-
-def _is_deposit(op_type_name: str) -> bool:
-    n = op_type_name.upper()
-    return ("INPUT" in n) or ("DEPOSIT" in n)
-
-
-def _is_withdrawal(op_type_name: str) -> bool:
-    n = op_type_name.upper()
-    return ("WITHDRAW" in n) or ("OUTPUT" in n)
+from tcs_stats._classify import OpCategory, op_type_attr, type_category
+from tcs_stats._paging import iter_operations
+from tcs_stats.time_windows import get_tz
+from tcs_stats.utils import (
+    ensure_tz,
+    nanos_from_units_nano,
+    round_nanos,
+    safe_currency,
+    to_utc,
+)
 
 
 # ---- models ------------------------------------------------------------------
 
 
-@dataclass
+@dataclass(slots=True)
 class InstrumentStats:
+    """Per-instrument totals; money fields are integer nanounits."""
     instrument_id: str
     instrument_name: str
     currency: str
@@ -64,16 +37,16 @@ class InstrumentStats:
     sell_trades: int = 0
     positive_trades: int = 0
     negative_trades: int = 0
-    cash_in: Decimal = Decimal("0")
-    cash_out: Decimal = Decimal("0")
-    commissions: Decimal = Decimal("0")
-    taxes: Decimal = Decimal("0")
-    dividends: Decimal = Decimal("0")
-    coupons: Decimal = Decimal("0")
-    other_in: Decimal = Decimal("0")
-    other_out: Decimal = Decimal("0")
-
-    def net_result(self) -> Decimal:
+    cash_in: int = 0
+    cash_out: int = 0
+    commissions: int = 0
+    taxes: int = 0
+    dividends: int = 0
+    coupons: int = 0
+    other_in: int = 0
+    other_out: int = 0
+
+    def net_result(self) -> int:
         return (
             self.cash_in
             - self.cash_out
@@ -100,30 +73,6 @@ class StatsResult:
 # ---- data helpers ------------------------------------------------------------
 
 
-async def _iter_operations(
-    services,
-    account_id: str,
-    dt_from_utc: datetime,
-    dt_to_utc: datetime,
-):
-    has_next = True
-    cursor: str | None = None
-    while has_next:
-        req = GetOperationsByCursorRequest(
-            account_id=account_id,
-            from_=dt_from_utc,
-            to=dt_to_utc,
-            cursor=cursor or "",
-            limit=1000,
-            state=OperationState.OPERATION_STATE_EXECUTED,
-        )
-        resp = await services.operations.get_operations_by_cursor(req)
-        for item in resp.items:
-            yield item
-        has_next = bool(resp.has_next)
-        cursor = resp.next_cursor if has_next else None
-
-
 def _instrument_identity(op) -> Tuple[str, str]:
     uid = getattr(op, "instrument_uid", None)
     figi = getattr(op, "figi", None)
@@ -165,11 +114,11 @@ def _ensure_total(
     return mapping[currency]
 
 
-def _apply_amount(stats: InstrumentStats, amount: Decimal, op_type_name: str) -> None:
+def _apply_amount(stats: InstrumentStats, amount: int, cat: OpCategory) -> None:
     if amount == 0:
         return
 
-    if _is_trade(op_type_name):
+    if cat is OpCategory.TRADE:
         stats.total_trades += 1
         if amount > 0:
             stats.sell_trades += 1
@@ -178,30 +127,23 @@ def _apply_amount(stats: InstrumentStats, amount: Decimal, op_type_name: str) ->
         else:
             stats.buy_trades += 1
             stats.negative_trades += 1
-            stats.cash_out += (-amount)
-    elif _is_fee(op_type_name):
-        stats.commissions += (amount if amount > 0 else -amount)
-    elif _is_tax(op_type_name):
-        stats.taxes += (amount if amount > 0 else -amount)
-    elif _is_dividend(op_type_name):
-        stats.dividends += (amount if amount > 0 else -amount)
-    elif _is_coupon(op_type_name):
-        stats.coupons += (amount if amount > 0 else -amount)
-    elif _is_deposit(op_type_name):
-        if amount > 0:
-            stats.other_in += amount
-        else:
-            stats.other_out += (-amount)
-    elif _is_withdrawal(op_type_name):
-        if amount > 0:
-            stats.other_in += amount
-        else:
-            stats.other_out += (-amount)
+            stats.cash_out -= amount
+        return
+
+    mag = -amount if amount < 0 else amount
+    if cat is OpCategory.FEE:
+        stats.commissions += mag
+    elif cat is OpCategory.TAX:
+        stats.taxes += mag
+    elif cat is OpCategory.DIVIDEND:
+        stats.dividends += mag
+    elif cat is OpCategory.COUPON:
+        stats.coupons += mag
+    elif amount > 0:
+        # Deposits, withdrawals and everything else are plain in/out flows.
+        stats.other_in += amount
     else:
-        if amount > 0:
-            stats.other_in += amount
-        else:
-            stats.other_out += (-amount)
+        stats.other_out += mag
 
 
 def _matches_filter(op, instrument_filter: str | None) -> bool:
@@ -229,18 +171,16 @@ async def collect_instrument_stats(
     until_local: datetime,
     tz_name: str,
     instrument_filter: str | None = None,
+    include_daily: bool = True,
 ) -> StatsResult:
-    tz = ZoneInfo(tz_name)
-    since_local = (
-        since_local.replace(tzinfo=tz)
-        if since_local.tzinfo is None
-        else since_local.astimezone(tz)
-    )
-    until_local = (
-        until_local.replace(tzinfo=tz)
-        if until_local.tzinfo is None
-        else until_local.astimezone(tz)
-    )
+    """Aggregate per-instrument stats for [since_local, until_local).
+
+    Per-day breakdowns (daily_totals_by_currency / daily_instruments) are
+    only built when include_daily is set; otherwise they are None.
+    """
+    tz = get_tz(tz_name)
+    since_local = ensure_tz(since_local, tz)
+    until_local = ensure_tz(until_local, tz)
 
     stats_by_instrument: Dict[Tuple[str, str], InstrumentStats] = {}
     totals: Dict[str, InstrumentStats] = {}
@@ -253,31 +193,40 @@ async def collect_instrument_stats(
         since_utc = to_utc(since_local)
         until_utc = to_utc(until_local)
 
-        async for op in _iter_operations(client, account_id, since_utc, until_utc):
+        type_attr: str | None = None
+        async for op in iter_operations(client, account_id, since_utc, until_utc):
             if not _matches_filter(op, instrument_filter):
                 continue
-            op_type = getattr(op, "operation_type", None) or getattr(op, "type", None)
-            op_type_name = getattr(op_type, "name", "UNSPECIFIED")
             payment = getattr(op, "payment", None)
             if payment is None:
                 continue
+            if payment.units == 0 and payment.nano == 0:
+                continue
 
+            if type_attr is None:
+                type_attr = op_type_attr(op)
+            op_type = getattr(op, type_attr, None)
+            cat = type_category(op_type)
             currency = safe_currency(getattr(payment, "currency", None))
-            amount = decimal_from_units_nano(payment.units, payment.nano)
+            amount = nanos_from_units_nano(payment.units, payment.nano)
             instrument_id, instrument_name = _instrument_identity(op)
 
-            op_date_raw = getattr(op, "date", None)
-            if isinstance(op_date_raw, datetime):
-                op_local_date = (
-                    op_date_raw.astimezone(tz).date()
-                    if op_date_raw.tzinfo
-                    else op_date_raw.replace(tzinfo=ZoneInfo("UTC")).astimezone(tz).date()
-                )
-            else:
-                op_local_date = since_local.date()
-
             inst_stats = _ensure_stats(stats_by_instrument, instrument_id, instrument_name, currency)
             total_stats = _ensure_total(totals, currency)
+            _apply_amount(inst_stats, amount, cat)
+            _apply_amount(total_stats, amount, cat)
+
+            if not include_daily:
+                continue
+
+            # The SDK always returns tz-aware UTC timestamps.
+            op_date_raw = getattr(op, "date", None)
+            op_local_date = (
+                op_date_raw.astimezone(tz).date()
+                if op_date_raw is not None
+                else since_local.date()
+            )
+
             daily_total_stats = _ensure_total(daily_totals[op_local_date], currency)
             daily_inst_stats = _ensure_stats(
                 daily_instruments[op_local_date],
@@ -285,11 +234,21 @@ async def collect_instrument_stats(
                 instrument_name,
                 currency,
             )
+            _apply_amount(daily_total_stats, amount, cat)
+            _apply_amount(daily_inst_stats, amount, cat)
 
-            _apply_amount(inst_stats, amount, op_type_name)
-            _apply_amount(total_stats, amount, op_type_name)
-            _apply_amount(daily_total_stats, amount, op_type_name)
-            _apply_amount(daily_inst_stats, amount, op_type_name)
+    result = StatsResult(
+        since=since_local,
+        until=until_local,
+        timezone=tz_name,
+        instruments=sorted(
+            stats_by_instrument.values(),
+            key=lambda s: (s.currency, -s.net_result(), s.instrument_name),
+        ),
+        totals_by_currency=totals,
+    )
+    if not include_daily:
+        return result
 
     day_cursor = since_local.date()
     if until_local > since_local:
@@ -301,31 +260,24 @@ async def collect_instrument_stats(
         _ = daily_instruments[day_cursor]
         day_cursor += timedelta(days=1)
 
-    return StatsResult(
-        since=since_local,
-        until=until_local,
-        timezone=tz_name,
-        instruments=sorted(
-            stats_by_instrument.values(),
+    result.daily_totals_by_currency = {
+        day: totals for day, totals in sorted(daily_totals.items())
+    }
+    result.daily_instruments = {
+        day: sorted(
+            instruments.values(),
             key=lambda s: (s.currency, -s.net_result(), s.instrument_name),
-        ),
-        totals_by_currency=totals,
-        daily_totals_by_currency={day: totals for day, totals in sorted(daily_totals.items())},
-        daily_instruments={
-            day: sorted(
-                instruments.values(),
-                key=lambda s: (s.currency, -s.net_result(), s.instrument_name),
-            )
-            for day, instruments in sorted(daily_instruments.items())
-        },
-    )
+        )
+        for day, instruments in sorted(daily_instruments.items())
+    }
+    return result
 
 
 # ---- presentation ------------------------------------------------------------
 
 
-def _format_money(amount: Decimal, currency: str) -> str:
-    return f"{round_money(amount, 2):,.2f} {currency}"
+def _format_money(amount: int, currency: str) -> str:
+    return f"{round_nanos(amount, 2):,.2f} {currency}"
 
 
 def _print_instrument_stats(stats: InstrumentStats, indent: str = "") -> None:
@@ -411,7 +363,7 @@ def _start_of_week(now: datetime) -> datetime:
 
 
 def _determine_period(tz_name: str, week: bool) -> Tuple[datetime, datetime]:
-    tz = ZoneInfo(tz_name)
+    tz = get_tz(tz_name)
     now = datetime.now(tz)
     if week:
         start = _start_of_week(now)
@@ -474,6 +426,7 @@ async def _amain() -> None:
         until_local=until,
         tz_name=args.tz,
         instrument_filter=args.filter,
+        include_daily=args.week,
     )
 
     print_report(result)
@@ -1,40 +1,49 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import date, datetime, time, timedelta
-from typing import Iterable, List, Literal
+import heapq
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from operator import attrgetter
+from typing import Iterable, List, Literal, NamedTuple
 from zoneinfo import ZoneInfo
 
 
 WindowKind = Literal["day", "week", "month", "year"]
 
+_ONE_DAY = timedelta(days=1)
+_ONE_WEEK = timedelta(days=7)
 
-@dataclass(frozen=True)
-class Window:
+
+class Window(NamedTuple):
     """Half-open time window [start, end) in the given timezone."""
     start: datetime
     end: datetime
     kind: WindowKind
 
 
-def _start_of_day(d: date, tz: ZoneInfo) -> datetime:
-    return datetime.combine(d, time.min).replace(tzinfo=tz)
+@lru_cache(maxsize=64)
+def get_tz(name: str) -> ZoneInfo:
+    """Return the ZoneInfo for an IANA name, memoized per name."""
+    return ZoneInfo(name)
 
 
-def _start_of_next_day(d: date, tz: ZoneInfo) -> datetime:
-    return _start_of_day(d + timedelta(days=1), tz)
+@lru_cache(maxsize=4096)
+def _start_of_day(d: date, tz: ZoneInfo) -> datetime:
+    # Memoized: day/week/month passes share most of their boundaries.
+    return datetime(d.year, d.month, d.day, tzinfo=tz)
 
 
-def _month_range(start: date, end: date) -> Iterable[date]:
-    y, m = start.year, start.month
-    end_y, end_m = end.year, end.month
-    while (y < end_y) or (y == end_y and m <= end_m):
-        yield date(y, m, 1)
-        if m == 12:
-            y, m = y + 1, 1
-        else:
-            m += 1
+def _clamp_edges(windows: List[Window], since: datetime, until: datetime) -> None:
+    """Clip the first and last window of an ordered run to [since, until)."""
+    if not windows:
+        return
+    first = windows[0]
+    if first.start < since:
+        windows[0] = Window(since, first.end, first.kind)
+    last = windows[-1]
+    if last.end > until:
+        windows[-1] = Window(last.start, until, last.kind)
 
 
 def split_into_windows(
@@ -59,51 +68,57 @@ def split_into_windows(
     """
     since_local = since.astimezone(tz)
     until_local = until.astimezone(tz)
-
-    windows: List[Window] = []
-
+    # One-shot iterables (generators) must survive four membership checks.
+    kinds = frozenset(kinds)
+    if since_local >= until_local:
+        return []
+
+    day_ws: List[Window] = []
+    week_ws: List[Window] = []
+    month_ws: List[Window] = []
+    year_ws: List[Window] = []
+
+    # Each pass emits whole calendar periods overlapping the range; only the
+    # first and last of them can stick out, so they are clamped afterwards.
     if "day" in kinds:
         d = since_local.date()
-        last = until_local.date()
-        while d <= last:
-            s = _start_of_day(d, tz)
-            e = _start_of_next_day(d, tz)
-            if e > since_local and s < until_local:
-                windows.append(Window(max(s, since_local), min(e, until_local), "day"))
-            d = d + timedelta(days=1)
+        s = _start_of_day(d, tz)
+        while s < until_local:
+            d = d + _ONE_DAY
+            e = _start_of_day(d, tz)
+            day_ws.append(Window(s, e, "day"))
+            s = e
+        _clamp_edges(day_ws, since_local, until_local)
 
     if "week" in kinds:
         # ISO week starts Monday
-        s = since_local
-        monday = _start_of_day((s.date() - timedelta(days=(s.isoweekday() - 1))), tz)
+        monday = _start_of_day(since_local.date() - timedelta(days=since_local.weekday()), tz)
         while monday < until_local:
-            e = monday + timedelta(days=7)
-            if e > since_local and monday < until_local:
-                windows.append(Window(max(monday, since_local), min(e, until_local), "week"))
+            e = monday + _ONE_WEEK
+            week_ws.append(Window(monday, e, "week"))
             monday = e
+        _clamp_edges(week_ws, since_local, until_local)
 
     if "month" in kinds:
-        start_month = since_local.date().replace(day=1)
-        end_month = until_local.date().replace(day=1)
-        for month_start in _month_range(start_month, end_month):
-            s = _start_of_day(month_start, tz)
-            if month_start.month == 12:
-                next_month = date(month_start.year + 1, 1, 1)
-            else:
-                next_month = date(month_start.year, month_start.month + 1, 1)
-            e = _start_of_day(next_month, tz)
-            if e > since_local and s < until_local:
-                windows.append(Window(max(s, since_local), min(e, until_local), "month"))
+        y, m = since_local.year, since_local.month
+        s = datetime(y, m, 1, tzinfo=tz)
+        while s < until_local:
+            y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+            e = datetime(y, m, 1, tzinfo=tz)
+            month_ws.append(Window(s, e, "month"))
+            s = e
+        _clamp_edges(month_ws, since_local, until_local)
 
     if "year" in kinds:
         y = since_local.year
-        last_y = until_local.year
-        while y <= last_y:
-            s = datetime(y, 1, 1, tzinfo=tz)
+        s = datetime(y, 1, 1, tzinfo=tz)
+        while s < until_local:
             e = datetime(y + 1, 1, 1, tzinfo=tz)
-            if e > since_local and s < until_local:
-                windows.append(Window(max(s, since_local), min(e, until_local), "year"))
+            year_ws.append(Window(s, e, "year"))
+            s = e
             y += 1
+        _clamp_edges(year_ws, since_local, until_local)
 
-    windows.sort(key=lambda w: w.start)
-    return windows
+    # Each run is already ordered by start: merge instead of re-sorting.
+    # Ties keep day, week, month, year order, as the stable sort did.
+    return list(heapq.merge(day_ws, week_ws, month_ws, year_ws, key=attrgetter("start")))
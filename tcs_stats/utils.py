@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import datetime, timezone, tzinfo
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Optional
+from typing import Dict, Optional
+
+
+_NANO = 1_000_000_000
+_QUANT_CACHE: Dict[int, Decimal] = {}
+_RUB = sys.intern("RUB")
 
 
 def decimal_from_units_nano(units: int, nano: int) -> Decimal:
@@ -17,27 +23,79 @@ def decimal_from_units_nano(units: int, nano: int) -> Decimal:
     Returns:
         Decimal monetary value with 9 digits after decimal point.
     """
-    sign = -1 if (units < 0 or nano < 0) else 1
-    abs_units = abs(units)
-    abs_nano = abs(nano)
-    val = Decimal(abs_units) + (Decimal(abs_nano) / Decimal("1000000000"))
-    return (val if sign > 0 else -val).quantize(Decimal("0.000000001"))
+    total = units * _NANO + nano
+    # Built straight from (sign, digits, exponent): no division, no quantize.
+    if total < 0:
+        return Decimal((1, tuple(map(int, str(-total))), -9))
+    return Decimal((0, tuple(map(int, str(total))), -9))
+
+
+def nanos_from_units_nano(units: int, nano: int) -> int:
+    """Convert Tinkoff 'units' + 'nano' to an integer amount of nanounits.
+
+    Integer totals are exact and much cheaper to accumulate than Decimal;
+    convert back with ``round_nanos`` on output.
+    """
+    return units * _NANO + nano
+
+
+def round_nanos(nanos: int, places: int = 4) -> float:
+    """Round integer nanounits to float with given places (ROUND_HALF_UP).
+
+    Same result as rounding the equivalent Decimal with ``round_money``, but
+    done in integer arithmetic, without Decimal allocations.
+    """
+    step = 10 ** (9 - places)
+    q, r = divmod(-nanos if nanos < 0 else nanos, step)
+    if 2 * r >= step:
+        q += 1
+    value = q / 10 ** places
+    return -value if nanos < 0 else value
 
 
 def to_utc(dt: datetime) -> datetime:
     """Ensure timezone-aware UTC datetime."""
-    if dt.tzinfo is None:
+    tz = dt.tzinfo
+    if tz is None:
         return dt.replace(tzinfo=timezone.utc)
+    if tz is timezone.utc:
+        return dt
     return dt.astimezone(timezone.utc)
 
 
+def ensure_tz(dt: datetime, tz: tzinfo) -> datetime:
+    """Express dt in tz; naive datetimes are taken to be in tz already.
+
+    Returns dt itself when it already carries tz (no new datetime).
+    """
+    if dt.tzinfo is tz:
+        return dt
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=tz)
+    return dt.astimezone(tz)
+
+
+def _quant(places: int) -> Decimal:
+    """Return the cached quantizer Decimal(10) ** -places."""
+    q = _QUANT_CACHE.get(places)
+    if q is None:
+        q = _QUANT_CACHE[places] = Decimal(10) ** -places
+    return q
+
+
 def round_money(value: Decimal, places: int = 4) -> float:
     """Round Decimal to float with given places (for JSON/Excel)."""
-    return float(value.quantize(Decimal(10) ** -places, rounding=ROUND_HALF_UP))
+    return float(value.quantize(_quant(places), rounding=ROUND_HALF_UP))
+
+
+class _AsFloatCache:
+    # Slot for MoneyLite.as_float results, left unset until first use; kept
+    # outside the dataclass fields so it is not in eq/repr/asdict/pickle.
+    __slots__ = ("_cache",)
 
 
-@dataclass(frozen=True)
-class MoneyLite:
+@dataclass(frozen=True, slots=True)
+class MoneyLite(_AsFloatCache):
     """Lightweight money holder for aggregation."""
     amount: Decimal
     currency: str
@@ -48,8 +106,18 @@ class MoneyLite:
         return MoneyLite(self.amount + other.amount, self.currency)
 
     def as_float(self, places: int = 4) -> float:
-        return round_money(self.amount, places)
+        # Immutable instance: results per places never go stale.
+        try:
+            cache = self._cache
+        except AttributeError:
+            cache = {}
+            object.__setattr__(self, "_cache", cache)
+        value = cache.get(places)
+        if value is None:
+            value = cache[places] = round_money(self.amount, places)
+        return value
 
 
 def safe_currency(cur: Optional[str]) -> str:
-    return cur or "RUB"
+    # Interned: currency strings end up in every aggregation key.
+    return sys.intern(cur) if cur else _RUB